@@ -0,0 +1,63 @@
+# agents/_kernels_aot.py
+# Optional ahead-of-time build of the fused indicator kernel.
+#
+# Run `python agents/_kernels_aot.py` once (numba required at build time
+# only) to produce an `indicator_kernels` extension module next to this
+# file. When that extension is importable, indicator_calculator.py uses it
+# instead of JIT-compiling: no warm-up pass, no numba runtime dependency,
+# and no first-call compile latency on machines without the on-disk JIT
+# cache. The loop body mirrors _compute_indicators in
+# indicator_calculator.py; the windows (5/20/14) are fixed, which is what
+# lets the whole kernel be compiled ahead of time.
+
+import numpy as np
+from numba.pycc import CC
+
+cc = CC('indicator_kernels')
+cc.verbose = True
+
+
+@cc.export('compute_indicators', 'void(f8[::1], f8[::1], f8[::1], f8[::1])')
+def compute_indicators(close, out_sma5, out_sma20, out_rsi14):
+    """Fills SMA_5, SMA_20 (running sums) and RSI_14 (Wilder smoothing) in
+    one loop over close; leading positions without a full window get NaN."""
+    n = close.shape[0]
+    sum5 = 0.0
+    sum20 = 0.0
+    avg_gain = 0.0
+    avg_loss = 0.0
+    for i in range(n):
+        v = close[i]
+        sum5 += v
+        sum20 += v
+        if i >= 5:
+            sum5 -= close[i - 5]
+        if i >= 20:
+            sum20 -= close[i - 20]
+        out_sma5[i] = sum5 / 5.0 if i >= 4 else np.nan
+        out_sma20[i] = sum20 / 20.0 if i >= 19 else np.nan
+        if i == 0:
+            out_rsi14[i] = np.nan
+        else:
+            change = v - close[i - 1]
+            gain = change if change > 0.0 else 0.0
+            loss = -change if change < 0.0 else 0.0
+            if i < 14:
+                avg_gain += gain
+                avg_loss += loss
+                out_rsi14[i] = np.nan
+            else:
+                if i == 14:
+                    avg_gain = (avg_gain + gain) / 14.0
+                    avg_loss = (avg_loss + loss) / 14.0
+                else:
+                    avg_gain = (avg_gain * 13.0 + gain) / 14.0
+                    avg_loss = (avg_loss * 13.0 + loss) / 14.0
+                if avg_loss == 0.0:
+                    out_rsi14[i] = 100.0
+                else:
+                    out_rsi14[i] = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+
+if __name__ == '__main__':
+    cc.compile()
@@ -2,21 +2,194 @@
 import pandas as pd
 import yaml
 import os
+import copy
+import threading
+from collections import OrderedDict
 
-def load_and_prepare_data(config_path="config.yaml"):
+# Prefer the libyaml-backed C loader when PyYAML was built with it; it parses
+# identically to SafeLoader but much faster, trimming Agent 1 startup time.
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Optional RAPIDS GPU backend. When cudf is installed (NVIDIA GPU present),
+# the CSV is parsed on-device and stays GPU-resident through Agent 2.
+try:
+    import cudf
+except ImportError:
+    cudf = None
+
+# Cache of parsed YAML files keyed by path, holding (mtime, size, parsed dict).
+# Several agents read the same config.yaml per pipeline run; caching avoids
+# re-parsing it on every call. Keyed on mtime+size so edits invalidate entries.
+_YAML_CACHE = OrderedDict()
+_YAML_CACHE_LOCK = threading.Lock()
+_YAML_CACHE_MAX_ENTRIES = 100
+
+def load_yaml_cached(path):
+    """
+    Parses a YAML file, reusing a cached result when the file is unchanged.
+
+    Returns a deep copy of the parsed content so callers can mutate the
+    result without corrupting the cache. Entries are evicted LRU-style
+    once the cache exceeds its size limit.
+    """
+    stat = os.stat(path)
+    key = (stat.st_mtime, stat.st_size)
+    with _YAML_CACHE_LOCK:
+        cached = _YAML_CACHE.get(path)
+        if cached is not None and cached[0] == key[0] and cached[1] == key[1]:
+            _YAML_CACHE.move_to_end(path)
+            return copy.deepcopy(cached[2])
+
+    with open(path, 'r') as f:
+        parsed = yaml.load(f, Loader=_YAML_LOADER)
+
+    with _YAML_CACHE_LOCK:
+        _YAML_CACHE[path] = (key[0], key[1], parsed)
+        _YAML_CACHE.move_to_end(path)
+        while len(_YAML_CACHE) > _YAML_CACHE_MAX_ENTRIES:
+            _YAML_CACHE.popitem(last=False)
+
+    return copy.deepcopy(parsed)
+
+# Target dtypes for the typed CSV fast path. Parsing straight into these
+# avoids a second full coercion pass (to_numeric/to_datetime) over the frame.
+_CSV_DTYPES = {
+    'Open': 'float32',
+    'High': 'float32',
+    'Low': 'float32',
+    'Close': 'float32',
+    'Adj Close': 'float32',
+    'Volume': 'int64',
+}
+
+# Rows per chunk for the pandas CSV reader. Bounds peak memory to roughly
+# one chunk plus the final frame while long histories stream in; small
+# enough to limit overhead, large enough to hide I/O latency.
+_CSV_CHUNK_ROWS = 100_000
+
+def _read_csv_gpu(raw_data_path):
+    """
+    Parses the CSV on the GPU with cuDF, returning a cudf.DataFrame, or
+    None when the GPU path is not requested, cudf is unavailable, or the
+    GPU read fails. Opt-in via USE_GPU=1 (set by main.py's --gpu flag) so
+    having cudf installed does not silently change the execution backend.
+    """
+    if cudf is None or os.environ.get('USE_GPU', '0') != '1':
+        return None
+    try:
+        return cudf.read_csv(raw_data_path, dtype=_CSV_DTYPES, parse_dates=['Date'])
+    except Exception as e:
+        print(f"WARNING: cuDF CSV load failed ({e}); using CPU readers.")
+        return None
+
+def _read_csv_arrow(raw_data_path):
+    """
+    Parses the CSV with pyarrow's multithreaded reader and a typed schema,
+    returning a pandas DataFrame. Returns None when pyarrow is missing or
+    strict typing fails, in which case the caller uses the pandas reader.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+    except ImportError:
+        return None
+    try:
+        convert_options = pacsv.ConvertOptions(column_types={
+            'Date': pa.timestamp('ns'),
+            'Open': pa.float32(),
+            'High': pa.float32(),
+            'Low': pa.float32(),
+            'Close': pa.float32(),
+            'Adj Close': pa.float32(),
+            'Volume': pa.int64(),
+        })
+        table = pacsv.read_csv(raw_data_path, convert_options=convert_options)
+        return table.to_pandas()
+    except Exception as e:
+        print(f"WARNING: pyarrow CSV load failed ({e}); using pandas reader.")
+        return None
+
+def _read_binary_cache(raw_data_path, cache_path):
+    """
+    Returns the DataFrame from the Parquet sidecar cache if it is at least
+    as new as the source CSV, else None. Parquet is columnar and already
+    typed, so cache hits skip text parsing and the coercion pass entirely.
+    """
+    try:
+        if (os.path.exists(cache_path)
+                and os.path.getmtime(cache_path) >= os.path.getmtime(raw_data_path)):
+            return pd.read_parquet(cache_path)
+    except Exception as e:
+        # Missing pyarrow or a corrupt cache file: just re-parse the CSV
+        print(f"WARNING: Could not read binary cache {cache_path}: {e}")
+    return None
+
+def _write_binary_cache(df, cache_path):
+    """Best-effort write of the Parquet sidecar; failures only cost the speedup."""
+    try:
+        df.to_parquet(cache_path, engine='pyarrow', compression='snappy')
+        print(f"Wrote binary cache: {cache_path}")
+    except Exception as e:
+        print(f"WARNING: Could not write binary cache {cache_path}: {e}")
+
+def _downcast_numeric(df, price_cols, volume_col='Volume'):
+    """
+    Shrinks numeric columns to the narrowest dtype that holds their values.
+
+    Prices become float32 and Volume an unsigned integer where possible,
+    roughly halving the memory (and cache bandwidth) the downstream rolling
+    indicators have to touch. Indicator outputs are numerically unchanged at
+    float32 precision for ~2-decimal price data.
+    """
+    for col in price_cols:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], downcast='float')
+    if volume_col in df.columns:
+        # Leaves the column as float if coercion introduced NaNs
+        df[volume_col] = pd.to_numeric(df[volume_col], downcast='unsigned')
+    return df
+
+def _to_arrow_dtypes(df):
+    """
+    Converts the numeric columns to pyarrow-backed dtypes so downstream
+    columnar consumers (cuDF, Polars, pyarrow IPC) can share the buffers
+    without copying. No-op when pyarrow is unavailable.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return df
+    try:
+        mapping = {
+            'Open': pd.ArrowDtype(pa.float32()),
+            'High': pd.ArrowDtype(pa.float32()),
+            'Low': pd.ArrowDtype(pa.float32()),
+            'Close': pd.ArrowDtype(pa.float32()),
+            'Adj Close': pd.ArrowDtype(pa.float32()),
+            'Volume': pd.ArrowDtype(pa.int64()),
+        }
+        return df.astype({col: dt for col, dt in mapping.items() if col in df.columns})
+    except Exception as e:
+        print(f"WARNING: Could not convert to Arrow-backed dtypes: {e}")
+        return df
+
+def load_and_prepare_data(config_path="config.yaml", config=None):
     """
     Loads NVIDIA stock data from the CSV specified in the config file,
     performs basic validation and type conversion, and returns a pandas DataFrame.
+
+    A pre-parsed config dict can be passed via `config` (the orchestrator
+    shares one parse across agents); otherwise config_path is read.
     """
     print("--- Running Agent 1: Data Loader & Preparer ---")
     try:
         # --- 1. Load Configuration ---
-        print(f"Loading configuration from: {config_path}")
-        if not os.path.exists(config_path):
-            print(f"ERROR: Config file not found at {config_path}")
-            return None
-        with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
+        if config is None:
+            print(f"Loading configuration from: {config_path}")
+            if not os.path.exists(config_path):
+                print(f"ERROR: Config file not found at {config_path}")
+                return None
+            config = load_yaml_cached(config_path)
 
         # Get data path from config, with a default fallback
         raw_data_path = config.get('data', {}).get('raw_data_path', 'data/raw/nvda_data.csv')
@@ -27,34 +200,79 @@ def load_and_prepare_data(config_path="config.yaml"):
             print(f"ERROR: Data file not found at {raw_data_path}")
             return None
 
-        print(f"Attempting to load CSV data from: {raw_data_path}")
-        df = pd.read_csv(raw_data_path)
-        print(f"Successfully loaded {len(df)} rows and {len(df.columns)} columns.")
+        cache_path = raw_data_path + '.parquet'
+        from_cache = False
+
+        # GPU path first: a cuDF frame stays device-resident through Agent 2,
+        # so the binary sidecar cache is bypassed entirely.
+        df = _read_csv_gpu(raw_data_path)
+        if df is not None:
+            typed_load = True
+            print(f"Loaded {len(df)} rows on the GPU via cuDF.")
+        else:
+            # Binary sidecar cache: serve from Parquet when it is fresh, so
+            # repeat runs pay no CSV parsing cost at all.
+            df = _read_binary_cache(raw_data_path, cache_path)
+            from_cache = df is not None
+        if df is not None and from_cache:
+            typed_load = True # The cache stores the fully typed, prepared frame
+            print(f"Loaded {len(df)} rows from binary cache: {cache_path}")
+        elif df is None:
+            print(f"Attempting to load CSV data from: {raw_data_path}")
+            # Prefer pyarrow's multithreaded CSV parser when it is installed
+            df = _read_csv_arrow(raw_data_path)
+            if df is not None:
+                typed_load = True
+            else:
+                try:
+                    # Fast path: parse dates and numeric columns in a single
+                    # pass, streaming in bounded chunks to cap peak memory.
+                    chunks = []
+                    for chunk in pd.read_csv(raw_data_path, dtype=_CSV_DTYPES,
+                                             parse_dates=['Date'], engine='c',
+                                             chunksize=_CSV_CHUNK_ROWS):
+                        chunks.append(chunk)
+                    if chunks:
+                        df = pd.concat(chunks, copy=False) if len(chunks) > 1 else chunks[0]
+                    else:
+                        # Header-only file: fall through with an empty frame
+                        df = pd.read_csv(raw_data_path, dtype=_CSV_DTYPES, engine='c')
+                    typed_load = True
+                except (ValueError, TypeError) as e:
+                    # Malformed values (or a missing 'Date' column) break strict typing;
+                    # fall back to permissive parsing plus the coercion pass below.
+                    print(f"WARNING: Typed CSV load failed ({e}); retrying with permissive parsing.")
+                    df = pd.read_csv(raw_data_path)
+                    typed_load = False
+            print(f"Successfully loaded {len(df)} rows and {len(df.columns)} columns.")
 
         # --- 3. Basic Validation & Preparation ---
         print("Performing basic validation and preparation...")
 
         # Check for essential columns
         required_columns = ['Date', 'Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
-        missing_cols = [col for col in required_columns if col not in df.columns]
+        # Set difference does the membership tests in one C-level hash pass
+        missing_cols = sorted(set(required_columns).difference(df.columns))
         if missing_cols:
             print(f"ERROR: Missing required columns: {missing_cols}")
             print(f"Available columns: {df.columns.tolist()}")
             return None
 
-        # Convert 'Date' column to datetime objects
-        try:
-            df['Date'] = pd.to_datetime(df['Date'])
-        except Exception as e:
-            print(f"ERROR: Could not convert 'Date' column to datetime: {e}")
-            # Consider returning None or raising error depending on desired strictness
-            return None
-
-        # Ensure numeric types for price/volume columns
         numeric_cols = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
-        for col in numeric_cols:
-            # 'coerce' turns non-numeric values into NaN (Not a Number)
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+        if not typed_load:
+            # Coercion pass, only needed when the typed fast path failed.
+            # Convert 'Date' column to datetime objects
+            try:
+                df['Date'] = pd.to_datetime(df['Date'])
+            except Exception as e:
+                print(f"ERROR: Could not convert 'Date' column to datetime: {e}")
+                # Consider returning None or raising error depending on desired strictness
+                return None
+
+            # Ensure numeric types for price/volume columns
+            for col in numeric_cols:
+                # 'coerce' turns non-numeric values into NaN (Not a Number)
+                df[col] = pd.to_numeric(df[col], errors='coerce')
 
         # Optional: Report or handle NaNs introduced during coercion
         if df[numeric_cols].isnull().any().any():
@@ -63,6 +281,18 @@ def load_and_prepare_data(config_path="config.yaml"):
             # Or fill with a value: df[numeric_cols] = df[numeric_cols].fillna(0) # Example: fill with 0
             # Or just report it for now.
 
+        # CPU-only post-processing; cuDF frames are already typed on-device
+        if isinstance(df, pd.DataFrame):
+            # Shrink column widths so the indicator stage moves fewer bytes
+            df = _downcast_numeric(df, numeric_cols[:-1])
+
+            # Refresh the binary sidecar so the next run skips CSV parsing
+            if not from_cache:
+                _write_binary_cache(df, cache_path)
+
+            # Hand the frame on with Arrow-backed columns for zero-copy reuse
+            df = _to_arrow_dtypes(df)
+
         print("Data loaded and basic preparation complete.")
         # (Add more data quality checks here later based on requirements)
 
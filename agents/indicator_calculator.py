@@ -1,21 +1,248 @@
 # agents/indicator_calculator.py
 # Agent 2: Calculates technical indicators
 
+import os
+import numpy as np
 import pandas as pd
-import pandas_ta as ta # Import the pandas-ta library
-import sys # Needed only if using the sys.path logic in test block below, technically optional here
+from dataclasses import dataclass
+
+# Optional RAPIDS GPU backend; cuDF frames from Agent 1 are processed with
+# device-resident rolling/ewm ops instead of the CPU kernels below.
+try:
+    import cudf
+except ImportError:
+    cudf = None
+
+# Numba JIT-compiles the indicator kernel below to native code. If numba is
+# not installed we fall back to vectorized pandas/NumPy equivalents, so this
+# module has no heavyweight imports beyond pandas/numpy themselves.
+try:
+    from numba import njit
+    _HAVE_NUMBA = True
+except ImportError:
+    _HAVE_NUMBA = False
+    def njit(*args, **kwargs):
+        # No-op decorator so the kernel definitions below still import cleanly
+        def wrap(func):
+            return func
+        if args and callable(args[0]):
+            return args[0]
+        return wrap
+
+# --- Indicator Kernel (fused single pass over the Close array) ---
+# All three indicators share one traversal of Close: the SMA running sums and
+# the Wilder gain/loss accumulators advance together, so the memory-bound
+# rolling work touches the input once instead of three times.
+
+@njit(cache=True, fastmath=True)
+def _compute_indicators(close, out_sma5, out_sma20, out_rsi14):
+    """Fills SMA_5, SMA_20 (running sums) and RSI_14 (Wilder smoothing) in
+    one loop over close; leading positions without a full window get NaN."""
+    n = close.shape[0]
+    sum5 = 0.0
+    sum20 = 0.0
+    avg_gain = 0.0
+    avg_loss = 0.0
+    for i in range(n):
+        v = close[i]
+        sum5 += v
+        sum20 += v
+        if i >= 5:
+            sum5 -= close[i - 5]
+        if i >= 20:
+            sum20 -= close[i - 20]
+        out_sma5[i] = sum5 / 5.0 if i >= 4 else np.nan
+        out_sma20[i] = sum20 / 20.0 if i >= 19 else np.nan
+        if i == 0:
+            out_rsi14[i] = np.nan
+        else:
+            change = v - close[i - 1]
+            gain = change if change > 0.0 else 0.0
+            loss = -change if change < 0.0 else 0.0
+            if i < 14:
+                # Still accumulating the initial 14-bar averages
+                avg_gain += gain
+                avg_loss += loss
+                out_rsi14[i] = np.nan
+            else:
+                if i == 14:
+                    avg_gain = (avg_gain + gain) / 14.0
+                    avg_loss = (avg_loss + loss) / 14.0
+                else:
+                    avg_gain = (avg_gain * 13.0 + gain) / 14.0
+                    avg_loss = (avg_loss * 13.0 + loss) / 14.0
+                if avg_loss == 0.0:
+                    out_rsi14[i] = 100.0
+                else:
+                    out_rsi14[i] = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+# Vectorized fallbacks, used when numba is unavailable. These beat the
+# pure-Python kernel loops by a wide margin in that case. (pandas' own rolling
+# engine='numba' was considered, but it needs numba too — and when numba is
+# present the fused kernel above has less per-call overhead.)
+
+def _sma_from_cumsum(cs, n):
+    """
+    SMA from a precomputed prefix-sum array (cs[0] == 0, len(cs) == N+1):
+    out[i] = (cs[i+1] - cs[i+1-n]) / n. A single O(N) cumsum serves every
+    window length with no rolling-window object overhead.
+    """
+    m = cs.shape[0] - 1
+    out = np.full(m, np.nan)
+    if m >= n:
+        out[n - 1:] = (cs[n:] - cs[:-n]) / n
+    return out
+
+def _rsi_pandas(close, n):
+    """
+    RSI via Wilder's recurrence, matching the JIT kernel exactly: the
+    average gain/loss is seeded at bar n with the simple mean of the first
+    n changes, then smoothed as avg = (avg*(n-1) + x)/n — an unadjusted
+    ewm(alpha=1/n) whose first observation is that seed. An unseeded ewm
+    disagrees with the kernel by several RSI points over the early bars,
+    which made reported RSI depend on whether numba was installed.
+    """
+    delta = close.diff()
+    gain = delta.clip(lower=0.0)
+    loss = -delta.clip(upper=0.0)
+
+    def _wilder(series):
+        seeded = series.copy()
+        # NaN out the warm-up so the seed is the first value ewm sees
+        seeded.iloc[:n + 1] = np.nan
+        if len(series) > n:
+            seeded.iloc[n] = series.iloc[1:n + 1].mean()
+        return seeded.ewm(alpha=1.0 / n, adjust=False).mean()
+
+    avg_gain = _wilder(gain)
+    avg_loss = _wilder(loss)
+    rsi = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    # The kernel pegs RSI at 100 when the average loss is zero; a 0/0
+    # ratio would otherwise surface here as NaN
+    return rsi.mask((avg_loss == 0) & avg_gain.notna(), 100.0)
+
+# Ahead-of-time build of the same kernel (see agents/_kernels_aot.py). When
+# the built extension is present it replaces the JIT version: no warm-up and
+# no numba needed at runtime, since the windows are fixed at compile time.
+# The build drops the extension next to this file, so it lives inside the
+# agents package: import it relatively first, and fall back to the top-level
+# name for script-mode runs (python agents/indicator_calculator.py) where
+# there is no parent package.
+try:
+    from .indicator_kernels import compute_indicators as _compute_indicators_aot
+except ImportError:
+    try:
+        from indicator_kernels import compute_indicators as _compute_indicators_aot
+    except ImportError:
+        _compute_indicators_aot = None
+if _compute_indicators_aot is not None:
+    _compute_indicators = _compute_indicators_aot
+
+# Either compiled form of the fused kernel counts as "kernels available"
+_HAVE_KERNELS = _HAVE_NUMBA or _compute_indicators_aot is not None
+
+# Warm up the JIT on a tiny dummy array at import time so the first real call
+# hits already-compiled (and disk-cached, via cache=True) code instead of
+# paying compile cost inside the timed pipeline. Set WARMUP=0 to skip, e.g.
+# for tooling that imports this module without running indicators. (The AOT
+# extension needs no warm-up; it is native code from the moment it imports.)
+if _HAVE_NUMBA and _compute_indicators_aot is None and os.environ.get("WARMUP", "1") == "1":
+    try:
+        _warmup_arr = np.arange(32, dtype=np.float64)
+        _warmup_out = np.empty(32)
+        _compute_indicators(_warmup_arr, _warmup_out, _warmup_out.copy(), _warmup_out.copy())
+        del _warmup_arr, _warmup_out
+    except Exception as _warmup_err:
+        # A stale on-disk JIT cache (e.g. one compiled while this module was
+        # imported under a different name) must not crash the import itself;
+        # demote to the vectorized fallbacks and carry on.
+        print(f"WARNING: JIT warm-up failed ({_warmup_err}); using vectorized fallbacks.")
+        _HAVE_NUMBA = False
+        _HAVE_KERNELS = False
+
+# --- Struct-of-Arrays Bar Container ---
+
+@dataclass(slots=True)
+class OHLCV:
+    """
+    Struct-of-arrays view of a bar history: each field is a contiguous
+    ndarray, the layout the njit kernels consume directly (Numba cannot
+    take DataFrames). Lets callers hand bars between stages without
+    paying DataFrame accessor overhead per indicator.
+    """
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    index: np.ndarray
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Extracts contiguous float64 arrays from an OHLCV DataFrame."""
+        def col(name):
+            if name in df.columns:
+                return np.ascontiguousarray(df[name].to_numpy(dtype=np.float64))
+            return np.empty(0)
+        return cls(open=col('Open'), high=col('High'), low=col('Low'),
+                   close=col('Close'), volume=col('Volume'),
+                   index=df.index.to_numpy())
+
+def compute_indicator_arrays(close):
+    """
+    Computes (sma_5, sma_20, rsi_14) as ndarrays for a contiguous Close
+    array — the array-level entry point shared by the DataFrame wrapper
+    below and any caller holding an OHLCV struct.
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    # NaN-tolerant path: the kernel's running sums and the cumsum fallback
+    # both carry a single NaN forward forever, NaN-ing every later row. The
+    # permissive loader coerces malformed cells to NaN by design, so such
+    # frames go through pandas rolling/ewm, which recovers as soon as the
+    # window clears the bad cell (matching the original pandas_ta behavior).
+    if np.isnan(close).any():
+        s = pd.Series(close)
+        sma5 = s.rolling(5).mean().to_numpy()
+        sma20 = s.rolling(20).mean().to_numpy()
+        rsi14 = _rsi_pandas(s, 14).to_numpy()
+        return sma5, sma20, rsi14
+    if _HAVE_KERNELS:
+        try:
+            sma5 = np.empty(close.shape[0])
+            sma20 = np.empty(close.shape[0])
+            rsi14 = np.empty(close.shape[0])
+            _compute_indicators(close, sma5, sma20, rsi14)
+            return sma5, sma20, rsi14
+        except Exception as e:
+            # Same stale-cache failure mode as the warm-up above, reachable
+            # when WARMUP=0 skipped it; fall through to the vectorized path
+            print(f"WARNING: Compiled indicator kernel failed ({e}); using vectorized fallbacks.")
+    # One cumsum over Close feeds both SMA windows
+    cs = np.empty(close.shape[0] + 1)
+    cs[0] = 0.0
+    np.cumsum(close, out=cs[1:])
+    sma5 = _sma_from_cumsum(cs, 5)
+    sma20 = _sma_from_cumsum(cs, 20)
+    rsi14 = _rsi_pandas(pd.Series(close), 14).to_numpy()
+    return sma5, sma20, rsi14
 
 # --- Agent 2 Core Function ---
 
-def calculate_technical_indicators(df: pd.DataFrame) -> pd.DataFrame:
+def calculate_technical_indicators(df: pd.DataFrame, inplace: bool = True) -> pd.DataFrame:
     """
-    Calculates technical indicators (SMA5, SMA20, RSI14) using pandas_ta
-    and adds them as new columns to the input DataFrame.
+    Calculates technical indicators (SMA5, SMA20, RSI14) using the JIT
+    kernels above and adds them as new columns to the input DataFrame.
+
+    By default this MUTATES the input: indicator columns are appended to
+    the passed frame and the same object is returned, so callers do not
+    need (and should not pay for) a defensive full-frame copy. Pass
+    inplace=False for an isolated copy instead.
 
     Args:
         df: Pandas DataFrame containing stock data.
             Requires at least a 'Close' column. Assumes standard
             OHLCV columns might be present for other indicators if needed later.
+        inplace: Append columns to the input frame (default) instead of a copy.
 
     Returns:
         Pandas DataFrame with calculated indicator columns added,
@@ -24,35 +251,47 @@ def calculate_technical_indicators(df: pd.DataFrame) -> pd.DataFrame:
     print("--- Running Agent 2: Technical Indicator Calculator ---")
     try:
         # --- Input Validation (Basic) ---
-        if df is None or not isinstance(df, pd.DataFrame) or df.empty:
+        is_gpu = cudf is not None and isinstance(df, cudf.DataFrame)
+        if df is None or not (isinstance(df, pd.DataFrame) or is_gpu) or df.empty:
             print("Agent 2 Error: Invalid or empty DataFrame received.")
             return None # Return None on bad input
         if 'Close' not in df.columns:
             print("Agent 2 Error: DataFrame must contain a 'Close' column for SMA/RSI.")
             return None # Return None on bad input
+        if not inplace:
+            df = df.copy() # Caller asked for isolation from the input frame
         # Add checks for High/Low if explicitly needed by an indicator later
         # if 'High' not in df.columns or 'Low' not in df.columns:
         #   print("Warning: High/Low columns missing, needed for some indicators.")
 
 
-        # --- Calculate Indicators using pandas_ta ---
-        # The '.ta.' accessor applies indicators directly to the DataFrame.
+        # --- Calculate Indicators ---
+        # Backend selection: CPU frames extract Close once (the same SoA
+        # layout OHLCV.from_dataframe produces) and go through the shared
+        # array-level entry point; cuDF frames use on-device rolling/ewm ops.
+        if not is_gpu:
+            sma5_out, sma20_out, rsi14_out = compute_indicator_arrays(
+                df['Close'].to_numpy(dtype=np.float64))
+
         print("Agent 2: Calculating SMA...")
-        df.ta.sma(length=5, append=True)  # Appends column named 'SMA_5'
+        df['SMA_5'] = df['Close'].rolling(5).mean() if is_gpu else sma5_out
         # Check if enough data for SMA 20 before calculating
         if len(df) >= 20:
-            df.ta.sma(length=20, append=True) # Appends column named 'SMA_20'
+            df['SMA_20'] = df['Close'].rolling(20).mean() if is_gpu else sma20_out
         else:
             print("Agent 2 Warning: Insufficient data for SMA_20 calculation.")
-            df['SMA_20'] = pd.NA # Add column with NAs if calculation skipped
+            # All-NaN float column when skipped; keeps the dtype stable and
+            # avoids pandas materializing an object/nullable-dtype Series
+            df['SMA_20'] = np.full(len(df), np.nan, dtype=np.float32)
 
         # Check if enough data for RSI 14 before calculating (needs length+1 technically for diff)
         print("Agent 2: Calculating RSI...")
         if len(df) >= 15:
-            df.ta.rsi(length=14, append=True) # Appends column named 'RSI_14'
+            df['RSI_14'] = _rsi_pandas(df['Close'], 14) if is_gpu else rsi14_out
         else:
              print("Agent 2 Warning: Insufficient data for RSI_14 calculation.")
-             df['RSI_14'] = pd.NA # Add column with NAs if calculation skipped
+             # Same NaN-fill as SMA_20 above
+             df['RSI_14'] = np.full(len(df), np.nan, dtype=np.float32)
 
 
         # --- Potential Future Indicators ---
@@ -87,8 +326,8 @@ if __name__ == '__main__':
     print("--- Input Dummy Data (Tail): ---")
     print(test_df.tail())
 
-    # Call the function defined in *this* file
-    df_with_indicators = calculate_technical_indicators(test_df.copy())
+    # Call the function defined in *this* file (appends columns in place)
+    df_with_indicators = calculate_technical_indicators(test_df)
 
     if df_with_indicators is not None:
         print("\n--- Test DataFrame with Indicators (Tail): ---")
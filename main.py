@@ -2,8 +2,23 @@
 
 import sys
 import os
+import asyncio
+import atexit
+import hashlib
+import logging
+import logging.handlers
+import functools
+import json
+import mmap
+import pickle
+import queue
 import pandas as pd # Make sure pandas is imported if you handle the df here
 import time         # Optional: for timing execution
+from concurrent.futures import ThreadPoolExecutor
+
+# Copy-on-Write: any frame that would need protecting copies lazily and only
+# if actually written to, so the eager defensive .copy() below is unnecessary
+pd.set_option("mode.copy_on_write", True)
 
 # --- Ensure the 'agents' directory can be found ---
 # Add project root to the Python path to help with imports
@@ -13,77 +28,409 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 # --- End Path Setup ---
 
-# --- Import functions from agent modules ---
+# --- Thread Placement ---
+# Numba and the OpenMP runtime read these at import time, so they must be set
+# before the agent modules (lazily) execute. Keeping worker threads on a
+# stable, bounded core set avoids cross-core (and on NUMA boxes, cross-
+# socket) migration of the indicator kernels' working set.
+os.environ.setdefault("NUMBA_NUM_THREADS", "8")
+os.environ.setdefault("OMP_PROC_BIND", "close")
+os.environ.setdefault("OMP_PLACES", "cores")
+if hasattr(os, 'sched_setaffinity'): # Linux only; no-op elsewhere
+    try:
+        os.sched_setaffinity(0, set(range(min(8, os.cpu_count() or 1))))
+    except OSError:
+        pass # Restricted environments (containers, cgroups) may refuse this
+
+# --- GPU Routing ---
+# Opt-in: --gpu sets USE_GPU=1, which Agent 1 reads to parse the CSV with
+# cuDF and keep the frame device-resident through Agent 2. The default stays
+# CPU so a machine that merely has cudf installed behaves predictably.
+if '--gpu' in sys.argv:
+    os.environ['USE_GPU'] = '1'
+
+# --- Logging ---
+# Pipeline messages go through a QueueHandler (a cheap enqueue on the caller's
+# thread) and a background QueueListener writes them to stdout, so terminal
+# flushes never block the compute path.
+_log_queue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(
+    _log_queue, logging.StreamHandler(sys.stdout))
+logging.basicConfig(level=logging.INFO, format="%(message)s",
+                    handlers=[logging.handlers.QueueHandler(_log_queue)])
+_log_listener.start()
+atexit.register(_log_listener.stop) # Flush remaining records at shutdown
+log = logging.getLogger("finance_agents.main")
+
+# --- Lazy Agent Imports ---
+# LazyLoader registers each agents.* module without executing its body; the
+# module (and its pandas/numba/LLM dependency tail) loads on first attribute
+# access. Startup and early-failure paths no longer pay seconds of imports,
+# and Agent 3's LLM stack stays unloaded when Agent 1 fails.
+import importlib.util
+
+def _lazy_import(name):
+    """Returns a module whose body executes on first attribute access."""
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"module {name!r} not found")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
 try:
-    from agents.data_loader import load_and_prepare_data
-    from agents.indicator_calculator import calculate_technical_indicators
-    from agents.pattern_identifier import analyze_patterns_and_report # Added Agent 3 import
-    print("Successfully imported agent functions.")
+    _data_loader = _lazy_import('agents.data_loader')
+    _indicator_calculator = _lazy_import('agents.indicator_calculator')
+    _pattern_identifier = _lazy_import('agents.pattern_identifier') # Agent 3
+    log.info("Successfully located agent modules.")
 except ImportError as e:
-    print(f"ERROR: Failed to import agent functions: {e}")
-    print("Check file paths, function names, and ensure __init__.py files exist in subdirectories.")
+    # ImportError (incl. ModuleNotFoundError) covers the realistic failure
+    # modes here; anything else should propagate with its full traceback
+    # rather than being masked by a catch-all
+    log.error("ERROR: Failed to import agent functions: %s", e)
+    log.error("Check file paths, function names, and ensure __init__.py files exist in subdirectories.")
     sys.exit(1) # Exit if imports fail
-except Exception as e:
-    print(f"An unexpected error occurred during import: {e}")
-    sys.exit(1)
 
-# --- Main Execution Logic ---
-if __name__ == '__main__':
-    start_time = time.time()
-    print("="*50)
-    print("Starting Finance Analysis Pipeline via main.py...")
-    print("="*50)
-
-    # Step 1: Load data using Agent 1
-    print("\nInvoking Agent 1: Data Loader...")
-    data_df = load_and_prepare_data() # Uses config.yaml by default
-
-    # Step 2: Calculate indicators using Agent 2
-    df_with_indicators = None # Initialize
-    if data_df is not None and not data_df.empty:
-        print("\nInvoking Agent 2: Indicator Calculator...")
-        df_with_indicators = calculate_technical_indicators(data_df.copy()) # Use copy
-
-        if df_with_indicators is not None and not df_with_indicators.empty:
-            # Basic check if indicators were added (can be more robust)
-            if 'SMA_5' not in df_with_indicators.columns or 'RSI_14' not in df_with_indicators.columns:
-                 print("Pipeline Warning: Agent 2 might not have added expected indicator columns (SMA_5, RSI_14).")
-                 # Decide whether to stop or continue
-            else:
-                 print("\n--- Agent 2 Output Check (DataFrame with Indicators - Tail) ---")
-                 print(df_with_indicators.tail())
-                 print("\nSuccessfully ran Agent 1 -> Agent 2 flow.")
-        else:
-            print("\nAgent 2: Indicator calculation failed or returned empty DataFrame.")
-            # df_with_indicators remains None
+# --- Config Loading ---
+# The config is parsed at most once per process and shared with every agent
+# via their config= parameter, so Agents 1 and 3 are guaranteed identical
+# settings and nobody re-parses YAML mid-run. A pickled sidecar next to the
+# YAML makes repeat runs skip PyYAML entirely: unpickling a small dict is
+# far cheaper than a YAML parse, and the sidecar is refreshed (best-effort)
+# whenever config.yaml is newer.
+
+_CONFIG = None
+_CONFIG_PATH = os.path.join(project_root, 'config.yaml')
+_CONFIG_PKL_PATH = _CONFIG_PATH + '.pkl'
+
+def get_config():
+    """Returns the parsed config dict, loading it at most once per process,
+    or None when config.yaml is missing (agents then take their usual
+    config-not-found failure path instead of an uncaught traceback)."""
+    global _CONFIG
+    if _CONFIG is not None:
+        return _CONFIG
+    if not os.path.exists(_CONFIG_PATH):
+        log.error("ERROR: Config file not found at %s", _CONFIG_PATH)
+        return None
+    try:
+        if (os.path.exists(_CONFIG_PKL_PATH)
+                and os.path.getmtime(_CONFIG_PKL_PATH) >= os.path.getmtime(_CONFIG_PATH)):
+            with open(_CONFIG_PKL_PATH, 'rb') as f:
+                _CONFIG = pickle.load(f)
+            return _CONFIG
+    except Exception as e:
+        log.warning("Could not read %s (%s); parsing YAML instead.", _CONFIG_PKL_PATH, e)
+    _CONFIG = _data_loader.load_yaml_cached(_CONFIG_PATH)
+    try:
+        with open(_CONFIG_PKL_PATH, 'wb') as f:
+            pickle.dump(_CONFIG, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        log.warning("Could not write %s: %s", _CONFIG_PKL_PATH, e)
+    return _CONFIG
+
+# --- Persistent Stage Cache ---
+# Agents 1 and 2 are deterministic functions of config.yaml plus the raw data
+# file, so their results are memoized on disk keyed by a content hash of both.
+# Repeat runs over unchanged inputs (the common case while iterating on the
+# Agent 3 prompt) then skip straight to the LLM stage.
+
+_PIPELINE_CACHE_DIR = os.path.join(project_root, '.cache', 'pipeline')
+
+def _pipeline_cache_key(config_path='config.yaml'):
+    """Content hash of the config file plus the raw data file it points at,
+    or None when either is unreadable (caching is then skipped)."""
+    try:
+        with open(config_path, 'rb') as f:
+            h = hashlib.blake2b(f.read(), digest_size=16)
+        config = get_config()
+        data_path = config.get('data', {}).get('raw_data_path', 'data/raw/nvda_data.csv')
+        with open(data_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        return h.hexdigest()
+    except Exception:
+        return None
+
+def _read_stage_cache(stage, key):
+    """Returns the cached DataFrame for (stage, key), or None on miss/error."""
+    if key is None:
+        return None
+    path = os.path.join(_PIPELINE_CACHE_DIR, f"{stage}-{key}.pkl")
+    if not os.path.exists(path):
+        return None
+    try:
+        result = pd.read_pickle(path)
+        log.info("Loaded cached %s result: %s", stage, path)
+        return result
+    except Exception as e:
+        log.warning("Could not read pipeline cache %s: %s", path, e)
+        return None
+
+def _write_stage_cache(stage, key, df):
+    """Best-effort write of a stage result; failures only cost the speedup."""
+    if key is None or df is None or getattr(df, 'empty', True):
+        return
+    try:
+        os.makedirs(_PIPELINE_CACHE_DIR, exist_ok=True)
+        df.to_pickle(os.path.join(_PIPELINE_CACHE_DIR, f"{stage}-{key}.pkl"))
+    except Exception as e:
+        log.warning("Could not write pipeline cache for %s: %s", stage, e)
+
+# --- Pipeline Orchestration ---
+
+_PRICE_COLS = ('Open', 'High', 'Low', 'Close', 'Adj Close')
+
+# Indicator columns Agent 2 is expected to add; checked as a set difference
+# so the test stays one hash-based operation however many indicators grow
+_REQUIRED_INDICATOR_COLS = frozenset(('SMA_5', 'RSI_14'))
+
+# Upper bound on in-flight LLM calls during the Agent 3 fan-out; each call is
+# I/O-bound on the Ollama server, which degrades past ~10 concurrent requests
+_LLM_MAX_CONCURRENCY = 10
+
+def _ensure_compact_dtypes(df):
+    """
+    Guarantees float32 price columns at the Agent 1 -> Agent 2 handoff.
+
+    The loader already emits float32 (Arrow-backed where pyarrow exists)
+    columns, so this is normally a no-op; it narrows float64 frames coming
+    from stale stage caches or the permissive CSV fallback, halving the
+    bandwidth the memory-bound indicator loops consume. Agent 2 accepts
+    float32 input by contract.
+    """
+    try:
+        to_narrow = {col: 'float32' for col in _PRICE_COLS
+                     if col in df.columns and str(df[col].dtype) == 'float64'}
+        if to_narrow:
+            df = df.astype(to_narrow, copy=False)
+    except Exception as e:
+        log.warning("dtype normalization skipped: %s", e)
+    return df
+
+# Per-stage wall times in integer nanoseconds, keyed by stage name. Filled by
+# run_pipeline() from perf_counter_ns(), which is monotonic (immune to NTP
+# clock jumps, unlike time.time) and cheap enough for sub-stage attribution.
+_STAGE_TIMINGS_NS = {}
+
+# The final report is persisted here and streamed to the terminal from the
+# same file, so downstream consumers read it without another render pass
+_REPORT_PATH = os.path.join(project_root, 'report.md')
+
+def _emit_report(final_report):
+    """
+    Writes the report to report.md once, then streams those same bytes to
+    stdout through an mmap of the file — the markdown blob is encoded a
+    single time instead of being materialized again for the terminal.
+    Falls back to plain logging if the file or mapping is unavailable.
+
+    The banner lines go through the same direct stdout write as the body:
+    routing them via the queue-based logger raced the background listener,
+    and the report body could print before its own header.
+    """
+    try:
+        data = final_report.encode('utf-8')
+        with open(_REPORT_PATH, 'wb') as f:
+            f.write(data)
+        out = sys.stdout.buffer
+        out.write(f"\n--- Agent 3 Final Report (written to {_REPORT_PATH}): ---\n".encode())
+        if data:
+            with open(_REPORT_PATH, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    out.write(m)
+        out.write(b"\n-----------------------------\n")
+        out.flush()
+    except Exception as e:
+        log.warning("Could not write/stream %s (%s); logging report instead.",
+                    _REPORT_PATH, e)
+        log.info("\n--- Agent 3 Final Report: ---")
+        log.info("%s", final_report)
+        log.info("-----------------------------")
+
+def _ok(result):
+    """
+    Single predicate for "did this stage produce something usable":
+    not None, not an empty DataFrame, and not an 'ERROR:' string. Replaces
+    the repeated None/empty/startswith checks that were scattered below.
+    """
+    if result is None:
+        return False
+    if isinstance(result, str):
+        return not result.startswith('ERROR:')
+    return not getattr(result, 'empty', False)
+
+def _prefetch_llm_chain():
+    """
+    Builds Agent 3's LLM chain ahead of time so the LangChain import and
+    Ollama client setup overlap Agent 2's numeric work instead of running
+    serially after it. Errors are ignored here; Agent 3 surfaces them
+    properly when it actually runs.
+    """
+    try:
+        config = get_config() if os.path.exists(_CONFIG_PATH) else {}
+        agent_config = config.get('agents', {}).get('pattern_reporting_agent', {})
+        _pattern_identifier._get_chain(agent_config.get('llm_model_id', 'llama3.1:8b'))
+    except Exception:
+        pass
+
+def _split_by_symbol(data_df):
+    """
+    Yields (symbol, sub_frame) pairs, one per ticker when the data carries a
+    'Symbol' column, else a single anonymous pair with the whole frame.
+    """
+    if 'Symbol' in data_df.columns:
+        for symbol, sub_df in data_df.groupby('Symbol', sort=False):
+            yield symbol, sub_df
     else:
-        print("\nAgent 1: Data loading failed. Workflow stopped before Agent 2.")
-        # df_with_indicators remains None
-
-    # Step 3: Analyze and Report using Agent 3
-    final_report = None # Initialize
-    if df_with_indicators is not None and not df_with_indicators.empty:
-        print("\nInvoking Agent 3: Pattern Identifier & Reporter...")
-        # Pass the DataFrame *with indicators* from Agent 2 to Agent 3
-        final_report = analyze_patterns_and_report(df_with_indicators) # Uses config.yaml by default
-
-        if final_report is None or final_report.startswith("ERROR:"):
-            print(f"\nAgent 3 failed or produced an error: {final_report}")
-            # Report is None or contains error string
+        yield None, data_df
+
+async def run_pipeline():
+    """
+    Runs Agent 1 -> Agent 2 -> Agent 3. Agents 2 and 3 fan out across
+    ticker groups on a thread pool (the numeric work releases the GIL, and
+    Agent 3 is I/O-bound on the LLM), then fan back in for the summary.
+    Returns the final report string, or None if the pipeline failed.
+    """
+    loop = asyncio.get_running_loop()
+    final_report = None
+    _STAGE_TIMINGS_NS.clear()
+    cache_key = _pipeline_cache_key()
+
+    # Step 1: Load data using Agent 1 (or its cached result)
+    log.info("\nInvoking Agent 1: Data Loader...")
+    t_stage = time.perf_counter_ns()
+    data_df = _read_stage_cache('agent1', cache_key)
+    if data_df is None:
+        data_df = _data_loader.load_and_prepare_data(config=get_config())
+        _write_stage_cache('agent1', cache_key, data_df)
+    _STAGE_TIMINGS_NS['agent1'] = time.perf_counter_ns() - t_stage
+    log.info("Agent 1 stage: %.1f ms", _STAGE_TIMINGS_NS['agent1'] / 1e6)
+
+    if not _ok(data_df):
+        log.info("\nAgent 1: Data loading failed. Workflow stopped before Agent 2.")
+        log.info("\nSkipping Agent 3 because previous steps failed or produced no data.")
+        return None
+
+    data_df = _ensure_compact_dtypes(data_df)
+
+    # Thread pool, not a process pool: worker threads share the process
+    # address space, so the per-symbol frames (and their NumPy buffers) are
+    # handed to Agents 2/3 zero-copy — no pickling and no shared_memory
+    # segment management, which a ProcessPoolExecutor would force. The
+    # numeric kernels and the LLM wait both release the GIL, so threads
+    # still get real parallelism here.
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+        # Warm Agent 3's chain concurrently with Agent 2: wall time becomes
+        # ~max(indicator compute, LLM setup) instead of their sum
+        chain_prefetch = loop.run_in_executor(pool, _prefetch_llm_chain)
+
+        # Step 2: Calculate indicators using Agent 2 (cached result, or
+        # fanned out per symbol)
+        t_stage = time.perf_counter_ns()
+        df_with_indicators = _read_stage_cache('agent2', cache_key)
+        if df_with_indicators is not None:
+            log.info("\nAgent 2: Using cached indicator results.")
+            ok_groups = list(_split_by_symbol(df_with_indicators))
         else:
-            print("\n--- Agent 3 Final Report: ---")
-            print(final_report)
-            print("-----------------------------")
-            print("Successfully ran Agent 1 -> Agent 2 -> Agent 3 flow.")
+            groups = list(_split_by_symbol(data_df))
+            log.info("\nInvoking Agent 2: Indicator Calculator (%d group(s))...", len(groups))
+            # No .copy(): Agent 2 appends columns in place by contract, and with
+            # CoW enabled the groupby sub-frames share buffers until written
+            tasks = [loop.run_in_executor(
+                         pool, _indicator_calculator.calculate_technical_indicators, sub_df)
+                     for _, sub_df in groups]
+            results = await asyncio.gather(*tasks)
 
-    else:
-        print("\nSkipping Agent 3 because previous steps failed or produced no data.")
+            ok_groups = [(symbol, res) for (symbol, _), res in zip(groups, results)
+                         if _ok(res)]
+            if not ok_groups:
+                log.info("\nAgent 2: Indicator calculation failed or returned empty DataFrame.")
+                log.info("\nSkipping Agent 3 because previous steps failed or produced no data.")
+                return None
+
+            # Fan in for the output check
+            frames = [frame for _, frame in ok_groups]
+            df_with_indicators = frames[0] if len(frames) == 1 else pd.concat(frames)
+            _write_stage_cache('agent2', cache_key, df_with_indicators)
+        _STAGE_TIMINGS_NS['agent2'] = time.perf_counter_ns() - t_stage
+        log.info("Agent 2 stage: %.1f ms", _STAGE_TIMINGS_NS['agent2'] / 1e6)
+
+        # Basic check if indicators were added (can be more robust)
+        missing_indicators = _REQUIRED_INDICATOR_COLS.difference(df_with_indicators.columns)
+        if missing_indicators:
+            log.warning("Pipeline Warning: Agent 2 might not have added expected indicator columns (%s).",
+                        ', '.join(sorted(missing_indicators)))
+            # Decide whether to stop or continue
+        else:
+            # tail() formats every cell; only render it when debug is on
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("\n--- Agent 2 Output Check (DataFrame with Indicators - Tail) ---")
+                log.debug("%s", df_with_indicators.tail())
+            log.info("\nSuccessfully ran Agent 1 -> Agent 2 flow.")
+
+        # Step 3: Analyze and Report using Agent 3, concurrently per symbol
+        await chain_prefetch # Chain construction overlapped the work above
+        log.info("\nInvoking Agent 3: Pattern Identifier & Reporter...")
+        t_stage = time.perf_counter_ns()
+        # Per-symbol calls run concurrently, capped by a semaphore so a wide
+        # ticker universe cannot swamp the LLM server
+        llm_slots = asyncio.Semaphore(_LLM_MAX_CONCURRENCY)
+
+        async def _analyze(frame):
+            async with llm_slots:
+                return await loop.run_in_executor(
+                    pool, functools.partial(
+                        _pattern_identifier.analyze_patterns_and_report,
+                        frame, config=get_config()))
+
+        reports = await asyncio.gather(*[_analyze(frame) for _, frame in ok_groups])
+        _STAGE_TIMINGS_NS['agent3'] = time.perf_counter_ns() - t_stage
+        log.info("Agent 3 stage: %.1f ms", _STAGE_TIMINGS_NS['agent3'] / 1e6)
+
+    report_parts = []
+    for (symbol, _), report in zip(ok_groups, reports):
+        if not _ok(report):
+            log.error("\nAgent 3 failed or produced an error: %s", report)
+        else:
+            report_parts.append(report if symbol is None else f"## {symbol}\n{report}")
+
+    if report_parts:
+        final_report = "\n\n".join(report_parts)
+        _emit_report(final_report) # Banner + body share one write path
+        log.info("Successfully ran Agent 1 -> Agent 2 -> Agent 3 flow.")
+
+    return final_report
+
+# --- Main Execution Logic ---
+if __name__ == '__main__':
+    start_ns = time.perf_counter_ns()
+    log.info("="*50)
+    log.info("Starting Finance Analysis Pipeline via main.py...")
+    log.info("="*50)
+
+    final_report = asyncio.run(run_pipeline())
+
+    # Verdict computed once, right after the pipeline returns; the summary
+    # lines below reuse it instead of re-running the None/ERROR checks
+    report_ok = _ok(final_report)
+    # The full report already went to report.md above; point at it rather
+    # than materializing and printing the whole blob a second time
+    summary_line = (f"Full report written to {_REPORT_PATH}." if report_ok
+                    else "No valid report generated.")
 
     # --- Output Final Summary ---
-    print("\n" + "="*50)
-    print("Final Analysis Report Summary:")
-    print(final_report if final_report and not final_report.startswith("ERROR:") else "No valid report generated.")
-    print("="*50)
-    end_time = time.time()
-    print(f"Pipeline finished in {end_time - start_time:.2f} seconds.")
-    print("==================================================")
\ No newline at end of file
+    log.info("\n" + "="*50)
+    log.info("Final Analysis Report Summary:")
+    log.info(summary_line)
+    log.info("="*50)
+    total_ns = time.perf_counter_ns() - start_ns
+    log.info("Pipeline finished in %.2f seconds.", total_ns / 1e9)
+    if '--json-timings' in sys.argv:
+        # Machine-readable per-stage breakdown (milliseconds), total included
+        timings_ms = {stage: ns / 1e6 for stage, ns in _STAGE_TIMINGS_NS.items()}
+        timings_ms['total'] = total_ns / 1e6
+        log.info("%s", json.dumps(timings_ms))
+    log.info("==================================================")